@@ -3,10 +3,28 @@
 
 import time
 import json
+import random
+import threading
+from email.utils import parsedate_to_datetime
 import requests
+import numpy as np
 import pandas as pd
 import streamlit as st
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = pc = None
+
+# Filters and column assignments return new frames; share data until written
+pd.set_option("mode.copy_on_write", True)
+
 st.set_page_config(page_title="PrizePicks EV Optimizer — Hands-Off", layout="wide")
 st.title("📈 PrizePicks EV Optimizer — Hands-Off")
 st.caption("Fully automated feed → de-vig → EV → best slips. Open and watch it update.")
@@ -49,56 +67,153 @@ with st.sidebar:
 # Safe PrizePicks fetch (with cache + cooldown)
 # --------------------------------------------
 
-@st.cache_data(show_spinner=False)
-def fetch_prizepicks(url: str):
-    # Fetch PrizePicks data with proxy support
-    r = requests.get(url, timeout=45)
+BACKOFF_BASE_SEC = 30
+BACKOFF_MAX_SEC = 600
+
+def retry_after_secs(value) -> int:
+    # Retry-After is either delta-seconds or an HTTP date; clamped to
+    # [0, BACKOFF_MAX_SEC] so a bogus header can't freeze the shared feed
+    if not value:
+        return 0
+    try:
+        secs = float(value)
+    except ValueError:
+        try:
+            secs = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError, OverflowError):
+            return 0
+    try:
+        return min(max(0, int(secs)), BACKOFF_MAX_SEC)
+    except (ValueError, OverflowError):  # nan / inf
+        return 0 if secs != secs or secs < 0 else BACKOFF_MAX_SEC
+
+@st.cache_resource
+def http_session() -> requests.Session:
+    # One pooled keep-alive session per server process, shared across reruns
+    session = requests.Session()
+    session.headers.update({"Accept-Encoding": "gzip, deflate", "User-Agent": "PPEV/1.0"})
+    return session
+
+def fetch_prizepicks(url: str, etag: str = None):
+    # Fetch PrizePicks data with proxy support; returns (data, etag) and
+    # data is None on a 304 (payload unchanged since etag)
+    headers = {"If-None-Match": etag} if etag else {}
+    r = http_session().get(url, timeout=45, headers=headers)
+    if r.status_code == 304:
+        return None, etag
     if r.status_code == 429:
-        raise RuntimeError("RATE_LIMIT")
+        raise RuntimeError(f"RATE_LIMIT:{retry_after_secs(r.headers.get('Retry-After'))}")
     if r.status_code == 403:
         raise RuntimeError("FORBIDDEN")
     r.raise_for_status()
 
     try:
-        data = r.json()
+        data = orjson.loads(r.content) if orjson is not None else r.json()
         # If response came through a proxy (like allorigins), unwrap it
         if isinstance(data, dict) and "contents" in data:
-            import json
             data = json.loads(data["contents"])
-        return data
+        return data, r.headers.get("ETag")
     except Exception as e:
         raise RuntimeError(f"JSON parse error: {e}")
 
-        raise RuntimeError(f"JSON parse error: {e}")
-
-def safe_fetch(url: str, min_gap_sec: int = 120):
-    now = time.time()
-    if "last_fetch_ts" not in st.session_state:
-        st.session_state["last_fetch_ts"] = 0
-    if "last_data" not in st.session_state:
-        st.session_state["last_data"] = None
-
-    if now - st.session_state["last_fetch_ts"] < min_gap_sec:
-        return st.session_state["last_data"]
-
+@st.cache_resource
+def shared_feeds() -> dict:
+    # Process-wide {url: {"data", "etag", "fetched_ts", "not_before",
+    # "backoff_sec", "in_flight"}} shared by every browser session, so open
+    # tabs reuse one upstream poll and one backoff window
+    return {"lock": threading.Lock(), "feeds": {}}
+
+def shared_feed_data(url: str):
+    feed = shared_feeds()["feeds"].get(url)
+    return feed["data"] if feed else None
+
+def safe_fetch(url: str, min_gap_sec: int = 15):
+    # Payload, ETag and backoff are shared across sessions
+    shared = shared_feeds()
+    with shared["lock"]:
+        feed = shared["feeds"].setdefault(
+            url, {"data": None, "etag": None, "fetched_ts": 0.0, "not_before": 0.0,
+                  "backoff_sec": 0.0, "in_flight": False}
+        )
+        now = time.time()
+        # Skip upstream if another session is polling or polled recently, or
+        # a backoff / Retry-After window is open; the lock is never held
+        # across the request
+        if (feed["in_flight"] or now < feed["not_before"]
+                or now - feed["fetched_ts"] < min_gap_sec):
+            return feed["data"]
+        feed["in_flight"] = True
+        etag = feed["etag"] if feed["data"] is not None else None
+
+    ok, err = False, None
     try:
-        data = fetch_prizepicks(url)
-        st.session_state["last_fetch_ts"] = now
-        st.session_state["last_data"] = data
-        return data
-    except RuntimeError:  # RATE_LIMIT
-        st.warning("⚠️ Rate limit hit — pausing 2 minutes and reusing last good data.")
-        st.session_state["last_fetch_ts"] = now
-        return st.session_state["last_data"]
-    r = requests.get(url, timeout=20)
-    r.raise_for_status()
-    return r.json()
+        data, etag = fetch_prizepicks(url, etag)
+        ok = True
+    except (RuntimeError, requests.RequestException) as e:
+        err = e
+    finally:
+        with shared["lock"]:
+            feed["in_flight"] = False
+            if ok:
+                if data is not None:
+                    feed["data"] = data
+                    feed["etag"] = etag
+                feed["fetched_ts"] = now
+                feed["backoff_sec"] = 0.0
+            elif err is not None:
+                # Any fetch failure (429/403/bad JSON, 5xx, connection, timeout):
+                # exponential backoff with jitter, never sooner than Retry-After
+                kind, _, secs = str(err).partition(":")
+                retry_after = int(secs) if kind == "RATE_LIMIT" and secs.isdigit() else 0
+                feed["backoff_sec"] = min(feed["backoff_sec"] * 2 or BACKOFF_BASE_SEC, BACKOFF_MAX_SEC)
+                wait = max(retry_after, feed["backoff_sec"] + random.uniform(0, 5))
+                feed["not_before"] = now + wait
+
+    if err is not None:
+        label = "Rate limit hit" if kind == "RATE_LIMIT" else f"Fetch failed ({err})"
+        st.warning(f"⚠️ {label} — retrying in ~{int(wait)}s and reusing last good data.")
+    return feed["data"]
+
+_LEAGUE_NORM_MAP = {
+    "NATIONAL FOOTBALL LEAGUE": "NFL",
+    "NATIONAL BASKETBALL ASSOCIATION": "NBA",
+    "MAJOR LEAGUE BASEBALL": "MLB",
+}
+
+# "included" types parse_pp reads; everything else (game, stat_type, ...) is skipped
+_INCLUDED_TYPES = frozenset({"new_player", "players", "player", "league", "team", "teams"})
 
 def to_safe_str(x):
     if x is None:
         return ""
     return str(x)
 
+def contains_ci(col: pd.Series, q: str) -> np.ndarray:
+    # Case-insensitive literal substring match as a bool mask
+    if pc is not None:
+        try:
+            arr = pa.array(col, type=pa.string(), from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Non-string values (e.g. a numeric league label) are matched on str()
+            arr = pa.array(col.map(to_safe_str), type=pa.string())
+        mask = pc.match_substring(arr, q, ignore_case=True).fill_null(False)
+        return mask.to_numpy(zero_copy_only=False)
+    q = q.lower()
+    return np.array([q in str(x).lower() for x in col], dtype=bool)
+
+def rel_id(rels: dict, *keys):
+    # relationships.<first present key>.data.id, or None when not linked
+    rel = next((rels[k] for k in keys if rels.get(k)), None) or {}
+    data = rel.get("data") or {}
+    return to_safe_str(data.get("id")) or None
+
+def stat_label(attrs: dict):
+    stat_type = attrs.get("stat_type") or attrs.get("projection_type") or attrs.get("type") or ""
+    # Some responses nest the stat label deeper; keep fallbacks:
+    if isinstance(stat_type, dict):
+        stat_type = stat_type.get("stat_type") or stat_type.get("name") or ""
+    return stat_type
+
 def parse_pp(json_obj: dict) -> pd.DataFrame:
     """
     PrizePicks returns:
@@ -121,6 +236,8 @@ def parse_pp(json_obj: dict) -> pd.DataFrame:
 
     for inc in included:
         inc_type = inc.get("type")
+        if inc_type not in _INCLUDED_TYPES:
+            continue
         inc_id = to_safe_str(inc.get("id"))
         attrs = inc.get("attributes", {}) or {}
 
@@ -133,80 +250,60 @@ def parse_pp(json_obj: dict) -> pd.DataFrame:
         elif inc_type in ("team", "teams"):
             teams_by_id[inc_id] = attrs.get("name") or attrs.get("abbreviation") or ""
 
-    rows = []
-    for item in data:
-        attrs = item.get("attributes", {}) or {}
-        rels = item.get("relationships", {}) or {}
-
-        # Stat / market
-        stat_type = attrs.get("stat_type") or attrs.get("projection_type") or attrs.get("type") or ""
-        # Some responses nest the stat label deeper; keep fallbacks:
-        if isinstance(stat_type, dict):
-            stat_type = stat_type.get("stat_type") or stat_type.get("name") or ""
-
-        # Line
-        line = attrs.get("line_score") or attrs.get("line") or attrs.get("value") or ""
-
-        # Link player via relationships
-        player_name = ""
-        player_rel = rels.get("new_player") or rels.get("player") or {}
-        player_data = player_rel.get("data") or {}
-        player_id = to_safe_str(player_data.get("id"))
-        if player_id and player_id in players_by_id:
-            player_name = players_by_id[player_id]
-
-        # League via relationships (if present)
-        league_name = ""
-        league_rel = rels.get("league") or {}
-        league_data = league_rel.get("data") or {}
-        league_id = to_safe_str(league_data.get("id"))
-        if league_id and league_id in leagues_by_id:
-            league_name = leagues_by_id[league_id]
-
-        # Team (best-effort; not always present)
-        team_name = ""
-        team_rel = rels.get("team") or {}
-        team_data = team_rel.get("data") or {}
-        team_id = to_safe_str(team_data.get("id"))
-        if team_id and team_id in teams_by_id:
-            team_name = teams_by_id[team_id]
-
-        # Fallbacks if not found in relationships
-        if not league_name:
-            league_name = attrs.get("league") or ""
-
-        rows.append({
-            "Player": player_name,
-            "League": league_name,
-            "Stat": to_safe_str(stat_type),
-            "Line": line,
-            "Team": team_name,
-        })
-
-    df = pd.DataFrame(rows)
+    # Column-at-a-time extraction; the id -> name joins are Series.map calls
+    attrs_list = [item.get("attributes", {}) or {} for item in data]
+    rels_list = [item.get("relationships", {}) or {} for item in data]
+
+    player_ids = pd.Series([rel_id(r, "new_player", "player") for r in rels_list], dtype=object)
+    league_ids = pd.Series([rel_id(r, "league") for r in rels_list], dtype=object)
+    team_ids = pd.Series([rel_id(r, "team") for r in rels_list], dtype=object)
+
+    # Fallbacks if not found in relationships
+    league = league_ids.map(leagues_by_id).fillna("")
+    league_attr = pd.Series([a.get("league") or "" for a in attrs_list], dtype=object)
+    league = league.where(league != "", league_attr)
+
+    df = pd.DataFrame({
+        "Player": player_ids.map(players_by_id).fillna(""),
+        "League": league,
+        "Stat": [to_safe_str(stat_label(a)) for a in attrs_list],
+        "Line": [a.get("line_score") or a.get("line") or a.get("value") or "" for a in attrs_list],
+        "Team": team_ids.map(teams_by_id).fillna(""),
+    })
     # Clean up/normalize
     if not df.empty:
         df["League"] = df["League"].fillna("")
         df["Stat"] = df["Stat"].fillna("").str.replace("_", " ").str.title()
         # Simple normalization for common league labels
-        df["LeagueNorm"] = (
-            df["League"].str.upper()
-            .replace({
-                "NATIONAL FOOTBALL LEAGUE": "NFL",
-                "NATIONAL BASKETBALL ASSOCIATION": "NBA",
-                "MAJOR LEAGUE BASEBALL": "MLB",
-            })
-        )
+        # (applied per distinct league label, not per row)
+        codes, leagues = pd.factorize(df["League"])
+        # str() so a non-string label (e.g. a numeric attributes.league) can't sink the feed
+        norm = [_LEAGUE_NORM_MAP.get(str(lg).upper(), str(lg).upper()) for lg in leagues]
+        df["LeagueNorm"] = np.asarray(norm, dtype=object)[codes]
+        if pa is not None:
+            for col in ("Player", "Stat", "Team"):
+                df[col] = df[col].astype("string[pyarrow]")
     return df
 
+def load_props(url: str) -> pd.DataFrame:
+    # Re-parse only when safe_fetch hands back a new payload object
+    data = safe_fetch(url)
+    if data is None:
+        raise RuntimeError("No PrizePicks data yet")
+    ss = st.session_state
+    if ss.get("parsed_from") is not data:
+        ss["parsed_df"] = parse_pp(data)
+        ss["parsed_from"] = data
+    return ss["parsed_df"]
+
 # ---------------------------
 # Load data (with graceful fallback)
 # ---------------------------
 placeholder = st.empty()
+err = None
 with st.spinner("Loading PrizePicks player props..."):
     try:
-        raw = fetch_prizepicks(api_url)
-        df = parse_pp(raw)
+        df = load_props(api_url)
         ok = not df.empty
     except Exception as e:
         ok = False
@@ -214,23 +311,27 @@ with st.spinner("Loading PrizePicks player props..."):
 
 if not ok:
     st.error("Could not parse player props. Showing a JSON preview so you can verify data is arriving.")
-    st.code(json.dumps(raw if 'raw' in locals() else {"error": err}, indent=2)[:5000])
+    preview = shared_feed_data(api_url) if err is None else {"error": err}
+    st.code(json.dumps(preview, indent=2)[:5000])
 else:
     # ---------------------------
     # Apply filters
     # ---------------------------
-    df_view = df.copy()
+    # Filters below return new frames and never write into df, so no copy
+    df_view = df
 
     if league_filter != "All":
-        df_view = df_view[df_view["League"].str.upper().str.contains(league_filter.upper()) |
-                          df_view.get("LeagueNorm", pd.Series([""]*len(df_view))).str.contains(league_filter.upper())]
+        mask = contains_ci(df_view["League"], league_filter)
+        if "LeagueNorm" in df_view.columns:
+            mask |= contains_ci(df_view["LeagueNorm"], league_filter)
+        df_view = df_view[mask]
 
     if text_filter.strip():
         q = text_filter.strip().lower()
         df_view = df_view[
-            df_view["Player"].str.lower().str.contains(q) |
-            df_view["Stat"].str.lower().str.contains(q) |
-            df_view["Team"].str.lower().str.contains(q)
+            contains_ci(df_view["Player"], q) |
+            contains_ci(df_view["Stat"], q) |
+            contains_ci(df_view["Team"], q)
         ]
 
     st.subheader("Live Data")
@@ -1,9 +1,17 @@
 
 import math
-import itertools
+import numpy as np
 import pandas as pd
 from typing import List, Tuple, Dict
 
+try:
+    from numba import njit
+except ImportError:  # pure-Python fallback, same results just slower
+    def njit(*args, **kwargs):
+        if args and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
 # ---------------- Core math ----------------
 
 POWER_MULT = {2: 3.0, 3: 6.0, 4: 10.0, 5: 20.0, 6: 37.5}
@@ -14,6 +22,17 @@ FLEX_TABLE = {
     6: {(6,): 25.0, (5,): 2.0, (4,): 0.4},
 }
 
+# Array forms of the tables above for hot loops: POWER_MULT_ARR[n] and
+# FLEX_MULT[n, k] = payout for k-of-n hits (0 where nothing is paid)
+POWER_MULT_ARR = np.zeros(7)
+for _n, _m in POWER_MULT.items():
+    POWER_MULT_ARR[_n] = _m
+FLEX_MULT = np.zeros((7, 7))
+for _n, _table in FLEX_TABLE.items():
+    for _outcomes, _m in _table.items():
+        for _k in _outcomes:
+            FLEX_MULT[_n, _k] = _m
+
 def amer_to_imp_prob(odds: int) -> float:
     if odds > 0:
         return 100.0 / (odds + 100.0)
@@ -30,79 +49,93 @@ def ev_power(ps: List[float], n: int) -> float:
     p_win = 1.0
     for p in ps:
         p_win *= p
-    return POWER_MULT[n] * p_win - 1.0
+    return POWER_MULT_ARR[n] * p_win - 1.0
 
-def ev_flex(ps: List[float], n: int) -> float:
-    table = FLEX_TABLE[n]
-    nlegs = len(ps)
-    dp = [0.0] * (nlegs + 1)
+@njit(cache=True)
+def ev_flex_nb(ps, flex_mult):
+    # Poisson-binomial DP over the number of legs hit; flex_mult is FLEX_MULT[n]
+    nlegs = ps.shape[0]
+    dp = np.zeros(nlegs + 1)
+    nxt = np.empty(nlegs + 1)
     dp[0] = 1.0
     for p in ps:
-        nxt = [0.0] * (nlegs + 1)
+        nxt[:] = 0.0
         for k in range(nlegs + 1):
-            if dp[k] == 0: 
+            if dp[k] == 0:
                 continue
             nxt[k] += dp[k] * (1 - p)
             if k + 1 <= nlegs:
                 nxt[k + 1] += dp[k] * p
-        dp = nxt
-    ev = 0.0
-    for outcomes, mult in table.items():
-        prob = sum(dp[k] for k in outcomes)
-        ev += prob * mult
-    return ev - 1.0
+        dp, nxt = nxt, dp
+    return (dp * flex_mult[:nlegs + 1]).sum() - 1.0
+
+def ev_flex(ps: List[float], n: int) -> float:
+    return ev_flex_nb(np.asarray(ps, dtype=np.float64), FLEX_MULT[n])
 
 def breakeven_p_power(n: int) -> float:
     m = POWER_MULT[n]
     return (1.0 / m) ** (1.0 / n)
 
+POWER_SIZES = (2, 3, 4, 5, 6)
+BE_POWER_VEC = np.array([breakeven_p_power(n) for n in POWER_SIZES])
+
 def compute_probabilities(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    p_over = []
-    for _, r in df.iterrows():
-        io = amer_to_imp_prob(int(r["over_odds"]))
-        iu = amer_to_imp_prob(int(r["under_odds"]))
-        p, _ = devig_two_way(io, iu)
-        p_over.append(p)
-    df["p_over"] = p_over
-    for n in [2,3,4,5,6]:
-        df[f"edge_vs_BE_power{n}"] = df["p_over"] - breakeven_p_power(n)
-    return df
+    odds_o = df["over_odds"].to_numpy(np.int64)
+    odds_u = df["under_odds"].to_numpy(np.int64)
+    # Same math as amer_to_imp_prob / devig_two_way, applied to whole columns
+    # (np.where evaluates both branches, so silence the unused side's warnings)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        io = np.where(odds_o > 0, 100.0 / (odds_o + 100.0), (-odds_o) / ((-odds_o) + 100.0))
+        iu = np.where(odds_u > 0, 100.0 / (odds_u + 100.0), (-odds_u) / ((-odds_u) + 100.0))
+        s = io + iu
+        p = np.where(s > 0, io / s, 0.5)
+    edges = p[:, None] - BE_POWER_VEC[None, :]
+    # assign returns a new frame, so the caller's df is left untouched
+    return df.assign(p_over=p, **{f"edge_vs_BE_power{n}": edges[:, i] for i, n in enumerate(POWER_SIZES)})
 
 def best_lineups(df: pd.DataFrame, top_k: int = 32, allow_same_game: bool = True) -> Dict[str, Dict[int, Dict]]:
-    df2 = df.copy().sort_values("edge_vs_BE_power3", ascending=False).head(top_k).reset_index(drop=True)
-    # optional "game" column for same-game suppression
-    def invalid_combo(idx_tuple):
-        if allow_same_game or "game" not in df2.columns:
-            return False
-        games = [str(df2.iloc[i].get("game", "")) for i in idx_tuple]
-        # If any duplicate game exists, block
-        return len(set(games)) < len(games)
+    # Sorted by p_over descending. Power and FLEX payouts never drop as more
+    # legs hit, so EV is monotonic in every leg and the best n-leg slip of
+    # either kind is the first n eligible rows (early pruning: no combo search).
+    df2 = df.sort_values("p_over", ascending=False).head(top_k).reset_index(drop=True)
+    # Hoisted once: leg probabilities and (optional) game ids for same-game suppression
+    p_arr = df2["p_over"].to_numpy(np.float64)
+    block_same_game = not allow_same_game and "game" in df2.columns
+    game_ids = None
+    if block_same_game:
+        games = df2["game"]
+        game_ids = pd.factorize(games.astype(str))[0]
+        # Legs with no game info (None/NaN/"") get unique ids so they never
+        # count as a repeated game
+        missing = (games.isna() | (games == "")).to_numpy()
+        game_ids[missing] = game_ids.max(initial=-1) + 1 + np.arange(missing.sum())
 
     results = {"power": {}, "flex": {}}
     idxs = list(df2.index)
-    rows = list(df2.itertuples())
 
-    for n in [2,3,4,5,6]:
-        best_p = -1e9; best_c = None
-        for combo in itertools.combinations(idxs, n):
-            if invalid_combo(combo): 
+    # Greedy scan for legs; skipping repeated games keeps it optimal since
+    # the constraint is "at most one leg per game".
+    legs = []
+    used_games = set()
+    for i in idxs:
+        if block_same_game:
+            if game_ids[i] in used_games:
                 continue
-            ps = [rows[i].p_over for i in combo]
-            evp = ev_power(ps, n)
-            if evp > best_p:
-                best_p, best_c = evp, combo
+            used_games.add(game_ids[i])
+        legs.append(i)
+        if len(legs) == 6:
+            break
+    # Power slips are prefixes of legs, so one cumulative log-sum gives the
+    # win probability for every n
+    cum_logp = np.cumsum(np.log(np.clip(p_arr[legs], 1e-12, 1.0)))
+
+    for n in POWER_SIZES:
+        best_c = tuple(legs[:n]) if len(legs) >= n else None
+        best_p = float(POWER_MULT_ARR[n] * np.exp(cum_logp[n - 1]) - 1.0) if best_c else -1e9
         results["power"][n] = {"ev": best_p, "combo_idxs": best_c}
         if n >= 3:
-            best_f = -1e9; best_cf = None
-            for combo in itertools.combinations(idxs, n):
-                if invalid_combo(combo): 
-                    continue
-                ps = [rows[i].p_over for i in combo]
-                evf = ev_flex(ps, n)
-                if evf > best_f:
-                    best_f, best_cf = evf, combo
-            results["flex"][n] = {"ev": best_f, "combo_idxs": best_cf}
+            best_f = ev_flex_nb(p_arr[list(best_c)], FLEX_MULT[n]) if best_c else -1e9
+            results["flex"][n] = {"ev": best_f, "combo_idxs": best_c}
     return results, df2
 
 def lineup_rows(df_small: pd.DataFrame, combo_idxs):
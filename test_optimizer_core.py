@@ -0,0 +1,58 @@
+import itertools
+import random
+
+import pandas as pd
+import pytest
+
+from optimizer_core import best_lineups, compute_probabilities, ev_flex, ev_power
+
+ODDS = [-400, -250, -180, -150, -130, -120, -110, 100, 110, 130, 160, 250]
+GAMES = ["a", "b", "c", "d", "e", "", None]
+
+
+def random_props(rng: random.Random, n: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "player": [f"p{i}" for i in range(n)],
+        "over_odds": [rng.choice(ODDS) for _ in range(n)],
+        "under_odds": [rng.choice(ODDS) for _ in range(n)],
+        "game": [rng.choice(GAMES) for _ in range(n)],
+    })
+
+
+def same_game(df2: pd.DataFrame, combo) -> bool:
+    # Legs with no game info never clash
+    games = [df2["game"].iloc[i] for i in combo]
+    known = [g for g in games if isinstance(g, str) and g]
+    return len(set(known)) < len(known)
+
+
+def brute_force(df2: pd.DataFrame, allow_same_game: bool):
+    ps = df2["p_over"].tolist()
+    best = {"power": {}, "flex": {}}
+    for n in [2, 3, 4, 5, 6]:
+        combos = [
+            c for c in itertools.combinations(range(len(df2)), n)
+            if allow_same_game or not same_game(df2, c)
+        ]
+        best["power"][n] = max((ev_power([ps[i] for i in c], n) for c in combos), default=None)
+        if n >= 3:
+            best["flex"][n] = max((ev_flex([ps[i] for i in c], n) for c in combos), default=None)
+    return best
+
+
+@pytest.mark.parametrize("allow_same_game", [True, False])
+@pytest.mark.parametrize("seed", range(40))
+def test_best_lineups_matches_brute_force(seed, allow_same_game):
+    rng = random.Random(seed)
+    df = compute_probabilities(random_props(rng, rng.randint(0, 11)))
+    results, df2 = best_lineups(df, top_k=11, allow_same_game=allow_same_game)
+    expected = brute_force(df2, allow_same_game)
+    for mode, by_n in expected.items():
+        for n, ev in by_n.items():
+            got = results[mode][n]
+            if ev is None:
+                assert got["combo_idxs"] is None
+            else:
+                assert got["ev"] == pytest.approx(ev, abs=1e-9)
+                if not allow_same_game:
+                    assert not same_game(df2, got["combo_idxs"])